@@ -2,99 +2,128 @@
 
 import os
 import sys
+import logging
+import functools
+from dataclasses import dataclass
+from typing import Optional
 import requests # --- NEW: Added for NewsAPI check ---
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-try:
-    from dotenv import load_dotenv
-except ImportError:
-    print("Error: 'python-dotenv' library not found. Please install it with 'pip install python-dotenv'", file=sys.stderr)
-    sys.exit(1)
-
-try:
-    from openai import OpenAI
-except ImportError:
-    print("Error: 'openai' library not found. Please install it with 'pip install openai'", file=sys.stderr)
-    sys.exit(1)
-
-try:
-    import google.generativeai as genai
-except ImportError:
-    print("Error: 'google-generativeai' library not found. Please install it with 'pip install google-generativeai'", file=sys.stderr)
-    sys.exit(1)
-    
-load_dotenv()
+from common import (load_dotenv, load_openai, load_genai, run_checks_concurrently, setup_logging,
+                    key_fingerprint, JsonTTLCache,
+                    GEMINI_MODEL, GEMINI_REQUEST_OPTIONS, DEFAULT_OPENAI_MODEL)
+
+logger = logging.getLogger("newsrecap.api_tests")
 
 # --- API Key Configuration ---
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-NEWS_API_KEY = os.getenv("NEWS_API_KEY") # --- NEW ---
+@dataclass(frozen=True)
+class ApiKeys:
+    openai: Optional[str]
+    gemini: Optional[str]
+    news: Optional[str]
+    openai_model: str
+
+@functools.lru_cache(maxsize=1)
+def get_api_keys():
+    """
+    Loads the .env file and reads the API keys (and the OpenAI model the
+    recap uses), once per process.
+    Call get_api_keys.cache_clear() to re-read them.
+    """
+    load_dotenv()
+    return ApiKeys(
+        openai=os.getenv("OPENAI_API_KEY"),
+        gemini=os.getenv("GEMINI_API_KEY"),
+        news=os.getenv("NEWS_API_KEY"),
+        openai_model=os.getenv("OPENAI_MODEL", DEFAULT_OPENAI_MODEL),
+    )
+
+NEWSAPI_URL = "https://newsapi.org/v2/top-headlines"
+
+# A passing NewsAPI probe is remembered for this many seconds (across runs).
+NEWSAPI_PROBE_TTL = 600
+_probe_cache = JsonTTLCache("newsapi_probe.json", NEWSAPI_PROBE_TTL)
+
+# Shared HTTP session so repeated requests reuse pooled TCP/TLS connections.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+))
 
 def check_api_keys():
     """Checks if the required API keys are set in the environment."""
-    if not OPENAI_API_KEY:
-        print("Error: OPENAI_API_KEY environment variable not set.", file=sys.stderr)
+    keys = get_api_keys()
+    if not keys.openai:
+        logger.error("Error: OPENAI_API_KEY environment variable not set.")
         return False
-    if not GEMINI_API_KEY:
-        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
+    if not keys.gemini:
+        logger.error("Error: GEMINI_API_KEY environment variable not set.")
         return False
     # --- NEW CHECK ---
-    if not NEWS_API_KEY:
-        print("Error: NEWS_API_KEY environment variable not set.", file=sys.stderr)
+    if not keys.news:
+        logger.error("Error: NEWS_API_KEY environment variable not set.")
         return False
     return True
 
 def check_gemini():
-    """Performs a simple initialization check on the Google Gemini API."""
-    print("Checking Google Gemini API...")
+    """
+    Performs a simple initialization check on the Google Gemini API.
+    Looks up the model's metadata, which validates the key without generating tokens.
+    Returns (ok, log) where log is a list of (level, message) pairs.
+    """
+    log = [(logging.INFO, "Checking Google Gemini API...")]
     try:
-        # Using the Client method from your script
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        response = client.models.generate_content(
-            model='gemini-2.5-pro', 
-            contents="Hello"
-        )
-        
-        if response.text and len(response.text) > 0:
-            print("Gemini API check successful.")
-            return True
-        else:
-            print("Gemini API check FAILED: Received an empty response.", file=sys.stderr)
-            return False
+        genai = load_genai()
+        genai.configure(api_key=get_api_keys().gemini)
+        genai.get_model(f"models/{GEMINI_MODEL}", request_options=GEMINI_REQUEST_OPTIONS)
+        log.append((logging.INFO, "Gemini API check successful."))
+        return True, log
             
     except Exception as e:
-        print(f"Gemini API check FAILED: {e}", file=sys.stderr)
-        return False
+        log.append((logging.ERROR, f"Gemini API check FAILED: {e}"))
+        return False, log
 
 def check_openai():
-    """Performs a simple initialization check on the OpenAI API."""
-    print("Checking OpenAI API...")
+    """
+    Performs a simple initialization check on the OpenAI API.
+    Retrieves the model's metadata, which validates the key without a completion.
+    Returns (ok, log) where log is a list of (level, message) pairs.
+    """
+    log = [(logging.INFO, "Checking OpenAI API...")]
+    openai = load_openai()
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "Hello"}],
-            max_tokens=5
-        )
-        
-        if response.choices[0].message.content and len(response.choices[0].message.content) > 0:
-            print("OpenAI API check successful.")
-            return True
-        else:
-            print("OpenAI API check FAILED: Received an empty response.", file=sys.stderr)
-            return False
+        # No SDK retries, so the check finishes well inside CHECK_TIMEOUT.
+        client = openai.OpenAI(api_key=get_api_keys().openai, timeout=10.0, max_retries=0)
+        client.models.retrieve(get_api_keys().openai_model)
+        log.append((logging.INFO, "OpenAI API check successful."))
+        return True, log
 
     except Exception as e:
-        print(f"OpenAI API check FAILED: {e}", file=sys.stderr)
-        return False
+        log.append((logging.ERROR, f"OpenAI API check FAILED: {e}"))
+        return False, log
+
+def _probe_cache_key(country, page_size):
+    """Cache key for a probe; includes a hash of the key so a new key is re-checked."""
+    return f"{key_fingerprint(get_api_keys().news)}:{country}:{page_size}"
 
 # --- NEW FUNCTION ---
 def check_newsapi():
-    """Performs a simple check on the NewsAPI."""
-    print("Checking NewsAPI...")
+    """
+    Performs a simple check on the NewsAPI.
+    Returns (ok, log) where log is a list of (level, message) pairs.
+    """
+    log = [(logging.INFO, "Checking NewsAPI...")]
+    cache_key = _probe_cache_key('us', 1)
+    if _probe_cache.get(cache_key):
+        log.append((logging.INFO, f"NewsAPI check successful (cached within the last {NEWSAPI_PROBE_TTL // 60} min)."))
+        return True, log
     try:
         # Make a simple request for 1 article
-        url = f"https://newsapi.org/v2/top-headlines?country=us&pageSize=1&apiKey={NEWS_API_KEY}"
-        response = requests.get(url, timeout=10)
+        params = {'country': 'us', 'pageSize': 1, 'apiKey': get_api_keys().news}
+        response = _SESSION.get(NEWSAPI_URL, params=params, timeout=10)
         
         # Check for HTTP error
         response.raise_for_status() 
@@ -103,46 +132,58 @@ def check_newsapi():
         
         # Check for API error
         if data.get('status') == 'ok':
-            print("NewsAPI check successful.")
-            return True
+            _probe_cache.set(cache_key, True)
+            log.append((logging.INFO, "NewsAPI check successful."))
+            return True, log
         else:
-            print(f"NewsAPI check FAILED: {data.get('message')}", file=sys.stderr)
-            return False
+            log.append((logging.ERROR, f"NewsAPI check FAILED: {data.get('message')}"))
+            return False, log
             
     except requests.exceptions.RequestException as e:
-        print(f"NewsAPI check FAILED: {e}", file=sys.stderr)
-        return False
+        log.append((logging.ERROR, f"NewsAPI check FAILED: {e}"))
+        return False, log
     except Exception as e:
-        print(f"NewsAPI check FAILED: An unexpected error occurred: {e}", file=sys.stderr)
-        return False
+        log.append((logging.ERROR, f"NewsAPI check FAILED: An unexpected error occurred: {e}"))
+        return False, log
 
 def main():
     """Main function to run the API checks."""
-    print("Starting API initialization checks...")
+    setup_logging()
+    logger.info("Starting API initialization checks...")
     
     if not check_api_keys():
-        print("\nPlease set the missing API keys as environment variables.", file=sys.stderr)
+        logger.error("\nPlease set the missing API keys as environment variables.")
         sys.exit(1)
         
-    print("-" * 30)
-    gemini_ok = check_gemini()
-    print("-" * 30)
-    openai_ok = check_openai()
-    print("-" * 30)
-    # --- NEW CHECK ---
-    newsapi_ok = check_newsapi()
-    print("-" * 30)
+    checks = [
+        ("Gemini", check_gemini),
+        ("OpenAI", check_openai),
+        ("NewsAPI", check_newsapi),
+    ]
+    results = run_checks_concurrently(checks)
+
+    # Print each check's buffered output in a fixed order.
+    logger.info("-" * 30)
+    for name, _ in checks:
+        _, log = results[name]
+        for level, message in log:
+            logger.log(level, message)
+        logger.info("-" * 30)
+
+    gemini_ok = results["Gemini"][0]
+    openai_ok = results["OpenAI"][0]
+    newsapi_ok = results["NewsAPI"][0]
 
     # --- UPDATED SUCCESS MESSAGE ---
     if gemini_ok and openai_ok and newsapi_ok:
-        print("\nSuccess: All API checks passed.")
-        print("Script is ready for news API logic.")
+        logger.info("\nSuccess: All API checks passed.")
+        logger.info("Script is ready for news API logic.")
     else:
-        print("\nFailure: One or more API checks failed.", file=sys.stderr)
-        print("Please check your API keys, network connection, and account status.", file=sys.stderr)
+        logger.error("\nFailure: One or more API checks failed.")
+        logger.error("Please check your API keys, network connection, and account status.")
         sys.exit(1)
 
-    print("Script finished.")
+    logger.info("Script finished.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+Helpers shared by api-tests.py and news-recap-and-email.py.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import hashlib
+import threading
+import logging
+import logging.handlers
+import functools
+import importlib
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+logger = logging.getLogger("newsrecap.common")
+
+# Models shared by both scripts, so the pre-flight checks validate the ones
+# the recap actually uses. The OpenAI model can be overridden with OPENAI_MODEL.
+GEMINI_MODEL = 'gemini-2.5-flash'
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+
+# Both scripts keep their on-disk caches in this directory.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "newsrecap")
+
+# Per-request Gemini timeout (seconds). The SDK's default retry policy keeps
+# retrying for up to 10 minutes and ignores the timeout; callers retry instead.
+GEMINI_TIMEOUT = 15
+GEMINI_REQUEST_OPTIONS = {'timeout': GEMINI_TIMEOUT, 'retry': None}
+
+# Seconds to wait for the concurrent API checks before giving up on the stragglers.
+# Must exceed the slowest single check request (Gemini's 15s timeout), or a
+# slow but valid check is reported as timed out.
+CHECK_TIMEOUT = 20
+
+class _BelowLevelFilter(logging.Filter):
+    """Passes only records below `level` (keeps warnings/errors off stdout)."""
+    def __init__(self, level):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno < self.level
+
+def setup_logging():
+    """
+    Routes log records through a queue so worker threads never block on
+    console I/O; one background listener thread writes them out. INFO goes
+    to stdout and WARNING and above to stderr. Safe to call more than once.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+
+    handlers = []
+    if sys.stdout is not None:  # None under pythonw.exe
+        out_handler = logging.StreamHandler(sys.stdout)
+        out_handler.addFilter(_BelowLevelFilter(logging.WARNING))
+        handlers.append(out_handler)
+    if sys.stderr is not None:
+        err_handler = logging.StreamHandler(sys.stderr)
+        err_handler.setLevel(logging.WARNING)
+        handlers.append(err_handler)
+
+    log_queue = queue.Queue(-1)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    # Only our own loggers log at INFO; keep third-party chatter (httpx etc.) quiet.
+    root.setLevel(logging.WARNING)
+    logging.getLogger("newsrecap").setLevel(logging.INFO)
+    # urllib3's retry warnings echo the request URL, which includes the NewsAPI key.
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+def _require(module_name, pip_name):
+    """Imports a module, or prints install instructions and exits if it's missing."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        logger.error(f"Error: '{pip_name}' library not found.")
+        logger.error(f"Please install it with: pip install {pip_name}")
+        sys.exit(1)
+
+# The AI SDKs are slow to import (pydantic, httpx, grpc...), so they are only
+# loaded the first time a check or summary actually needs them.
+@functools.lru_cache(maxsize=None)
+def load_openai():
+    """Returns the `openai` module, importing it on first use."""
+    return _require("openai", "openai")
+
+@functools.lru_cache(maxsize=None)
+def load_genai():
+    """Returns the `google.generativeai` module, importing it on first use."""
+    return _require("google.generativeai", "google-generativeai")
+
+@functools.lru_cache(maxsize=8)
+def get_gemini_model(model_name, api_key):
+    """
+    Returns a GenerativeModel for (model_name, api_key). The model is built
+    once per process so repeated checks and summaries reuse its client.
+    """
+    genai = load_genai()
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+def load_dotenv():
+    """Loads variables from the .env file into os.environ."""
+    _require("dotenv", "python-dotenv").load_dotenv()
+
+def key_fingerprint(key):
+    """Short hash of an API key, so caches never store the key itself."""
+    return hashlib.sha256((key or "").encode("utf-8")).hexdigest()[:16]
+
+class JsonTTLCache:
+    """
+    A small {key: value} store kept in a JSON file in CACHE_DIR. Entries
+    expire `ttl` seconds after they are set. Safe to use from several
+    threads; a missing or unreadable file is treated as empty and write
+    failures are ignored.
+    """
+    def __init__(self, filename, ttl):
+        self.path = os.path.join(CACHE_DIR, filename)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+        except OSError:
+            pass
+
+    def _fresh(self, entry):
+        return isinstance(entry, dict) and time.time() - entry.get("ts", 0) < self.ttl
+
+    def get(self, key):
+        """Returns the value stored under key, or None if it's missing or expired."""
+        with self._lock:
+            entry = self._load().get(key)
+        return entry.get("value") if self._fresh(entry) else None
+
+    def set(self, key, value):
+        """Stores value under key, dropping any expired entries."""
+        with self._lock:
+            entries = {k: v for k, v in self._load().items() if self._fresh(v)}
+            entries[key] = {"value": value, "ts": time.time()}
+            self._save(entries)
+
+    def delete(self, key):
+        """Removes key, if present."""
+        with self._lock:
+            entries = self._load()
+            if entries.pop(key, None) is not None:
+                self._save(entries)
+
+def run_checks_concurrently(checks):
+    """
+    Runs the (name, check_fn) pairs in parallel threads. Each check_fn
+    returns (ok, log) where log is a list of (level, message) pairs.
+    Returns {name: (ok, log)}; checks that miss CHECK_TIMEOUT count as failed.
+    """
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=len(checks))
+    futures = {executor.submit(fn): name for name, fn in checks}
+    try:
+        for future in as_completed(futures, timeout=CHECK_TIMEOUT):
+            results[futures[future]] = future.result()
+    except FuturesTimeoutError:
+        for future, name in futures.items():
+            if name not in results:
+                results[name] = (False, [(logging.ERROR, f"{name} check FAILED: Timed out after {CHECK_TIMEOUT}s.")])
+    finally:
+        # Don't block on a hung check; its thread finishes in the background.
+        executor.shutdown(wait=False)
+    return results
@@ -1,269 +1,1141 @@
 import os
 import sys
+import logging
 import smtplib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
-import openai
+import signal
+import atexit
+import asyncio
+import re
 import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+import io
 import mimetypes
+import string
+from html import escape
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
+from email.message import EmailMessage
 
+from common import (load_dotenv, load_openai, load_genai, get_gemini_model, run_checks_concurrently, setup_logging,
+                    key_fingerprint, JsonTTLCache, CACHE_DIR,
+                    GEMINI_MODEL, GEMINI_TIMEOUT, GEMINI_REQUEST_OPTIONS, DEFAULT_OPENAI_MODEL)
+
+logger = logging.getLogger("newsrecap.recap")
+
+# Optional: orjson parses and serializes JSON faster (and more strictly) than the stdlib.
 try:
-    from dotenv import load_dotenv
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode("utf-8")
 except ImportError:
-    print("Error: 'python-dotenv' library not found.", file=sys.stderr)
-    print("Please install it with: pip install python-dotenv", file=sys.stderr)
-    sys.exit(1)
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False)
 
+# Optional: with Pillow installed, large images are downscaled before attaching.
 try:
-    import google.generativeai as genai
+    from PIL import Image
 except ImportError:
-    print("Error: 'google-generativeai' library not found.", file=sys.stderr)
-    print("Please install it with: pip install google-generativeai", file=sys.stderr)
-    sys.exit(1)
+    Image = None
 
+# The openai and google-generativeai SDKs take about a second to import, so
+# they are loaded on first use (load_openai / load_genai) rather than here.
 
 # Updated to use GenerativeModel
 gemini_model = None
 openai_client = None
 
+# Per-request OpenAI timeout (seconds; Gemini's is in common.py), and an outer bound for the whole run.
+OPENAI_TIMEOUT = 10.0
+RUN_TIMEOUT = 300
+
+# Longest wait honored from a Retry-After header; anything longer would
+# eat most of RUN_TIMEOUT on a single retry.
+MAX_RETRY_AFTER = 30
+
+# A batched request gets this many extra seconds per article on top of the
+# single-request timeout, and is retried this many times on rate limits,
+# 5xx and timeouts before its articles are given up on.
+BATCH_TIMEOUT_PER_ITEM = 5
+BATCH_MAX_RETRIES = 3
+
+# Fixed settings for every Gemini request, built once at import.
+GEMINI_SAFETY_SETTINGS = {
+    'HATE': 'BLOCK_NONE',
+    'HARASSMENT': 'BLOCK_NONE',
+    'SEXUAL': 'BLOCK_NONE',
+    'DANGEROUS': 'BLOCK_NONE'
+}
+GEMINI_GENERATION_CONFIG = {'temperature': 0.6, 'top_p': 1.0, 'top_k': 1}
+
+# The static instructions come first and only the article varies at the end,
+# so repeated requests share the longest possible prompt prefix.
+GEMINI_PROMPT_TEMPLATE = """
+    You are a text transformation assistant.
+    Your ONLY task is to rewrite the provided "Base Summary" into a single, neutral paragraph.
+    
+    IMPORTANT:
+    1. DO NOT use any external knowledge.
+    2. DO NOT fact-check the information.
+    3. You MUST assume the "Base Summary" is the absolute source of truth for this task, even if it seems incorrect.
+    4. Your output must be a concise rewrite of the summary, maintaining a strictly neutral, factual tone.
+
+    Headline: {article_title}
+    Base Summary: {base_summary}
+    
+    Rewritten Summary:
+    """
+
+# Same rules as GEMINI_PROMPT_TEMPLATE, for rewriting several articles in one request.
+GEMINI_BATCH_PROMPT = """
+    You are a text transformation assistant.
+    You will be given a JSON array of news items, each with an id, a headline and a summary.
+    Your ONLY task is to rewrite each item's summary into a single, neutral paragraph.
+    
+    IMPORTANT:
+    1. DO NOT use any external knowledge.
+    2. DO NOT fact-check the information.
+    3. You MUST assume each summary is the absolute source of truth for this task, even if it seems incorrect.
+    4. Each rewrite must be concise, maintaining a strictly neutral, factual tone.
+    5. Return exactly one rewrite per input item, with that item's id.
+
+    Items:
+    """
+# The batched reply is constrained to this schema, so it parses as-is.
+GEMINI_BATCH_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'rewrites': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'id': {'type': 'integer'}, 'rewrite': {'type': 'string'}},
+                'required': ['id', 'rewrite'],
+            },
+        },
+    },
+    'required': ['rewrites'],
+}
+GEMINI_BATCH_GENERATION_CONFIG = {
+    **GEMINI_GENERATION_CONFIG,
+    'response_mime_type': 'application/json',
+    'response_schema': GEMINI_BATCH_RESPONSE_SCHEMA,
+}
+
+# HTML for the email, parsed once at import and filled in per article.
+EMAIL_HTML_HEAD = """
+            <html>
+                <head></head>
+                <body>
+                    """
+EMAIL_HTML_TAIL = """
+                </body>
+            </html>
+            """
+IMAGE_HTML_TEMPLATE = string.Template('''
+                        <img src="cid:$cid"
+                             alt="$title"
+                             style="max-width: 100%; height: auto; border-radius: 8px; margin-bottom: 10px;">
+                        ''')
+ARTICLE_HTML_TEMPLATE = string.Template("""
+                <div style="font-family: Arial, sans-serif; margin-bottom: 20px;">
+                    <p style="font-size: 1.2em; margin-bottom: 5px;">
+                        <b>$index. <a href="$url" style="color: #1a0dab; text-decoration: none;">$title</a></b>
+                    </p>
+                    <p style="font-size: 0.9em; color: #333; margin-top: 0; margin-bottom: 10px;">
+                        $author_part
+                    </p>
+                    
+                    $image_part
+                    
+                    <b style="font-size: 1.0em;">Summary by Gemini:</b>
+                    <ul style="margin-top: 5px;">
+                        <li>$gemini_summary</li>
+                    </ul>
+                    
+                    <b style="font-size: 1.0em;">Summary by OpenAI:</b>
+                    <ul style="margin-top: 5px;">
+                        <li>$openai_summary</li>
+                    </ul>
+                </div>
+                <hr style="border: 0; border-top: 1px solid #eee;">
+                """)
+
+# Max number of OpenAI / Gemini summary requests in flight at once
+# (override with OPENAI_CONCURRENCY / GEMINI_CONCURRENCY).
+OPENAI_MAX_CONCURRENCY = 5
+GEMINI_MAX_CONCURRENCY = 5
+
+# Max number of article images downloaded at once.
+IMAGE_DOWNLOAD_WORKERS = 5
+
+# Images larger than this are skipped rather than read into memory and mailed.
+MAX_IMAGE_BYTES = 2 * 1024 * 1024
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Downloaded images over SHRINK_MIN_BYTES are resized to fit IMAGE_MAX_DIMENSION
+# and re-encoded as JPEG (needs Pillow); smaller ones are attached as-is.
+SHRINK_MIN_BYTES = 100 * 1024
+IMAGE_MAX_DIMENSION = 800
+IMAGE_JPEG_QUALITY = 80
+# Client errors worth retrying; any other 4xx skips the image straight away.
+IMAGE_RETRY_STATUSES = (408, 429)
+# requests' timeout only limits each socket read, so a server trickling bytes
+# could hold a download open indefinitely; an attempt is dropped after this long.
+IMAGE_ATTEMPT_TIMEOUT = 20
+
+# Shared HTTP session for NewsAPI and the image downloads, so requests to the
+# same host reuse pooled TCP/TLS connections. The OpenAI and Gemini clients
+# are each created once and keep their own pools.
+NEWSAPI_URL = "https://newsapi.org/v2/top-headlines"
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=IMAGE_DOWNLOAD_WORKERS))
+_SESSION.mount('http://', HTTPAdapter(pool_connections=10, pool_maxsize=IMAGE_DOWNLOAD_WORKERS))
+# NewsAPI requests retry transient failures with exponential backoff (the image
+# downloads have their own retry loop, so they don't get this adapter).
+class _CappedRetry(Retry):
+    """Retry that waits at most MAX_RETRY_AFTER seconds for a Retry-After header."""
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+_SESSION.mount('https://newsapi.org/', HTTPAdapter(
+    max_retries=_CappedRetry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+# A successful NewsAPI response is reused by runs within this many seconds
+# (stored in the response cache), which also spares the free-tier quota.
+NEWSAPI_CACHE_TTL = 1800
+
+# Fallback OpenAI model (override with OPENAI_FALLBACK_MODEL; the main one is
+# DEFAULT_OPENAI_MODEL / OPENAI_MODEL). An empty reply is retried once on
+# the fallback model.
+DEFAULT_OPENAI_FALLBACK_MODEL = "gpt-4o"
+
+class AsyncRateLimiter:
+    """
+    Token-bucket limiter for coroutines. Allows `rate` acquisitions per
+    `period` seconds and only sleeps when that rate would be exceeded.
+    """
+    def __init__(self, rate, period=1.0):
+        self.rate = rate
+        self.period = period
+        self._tokens = rate
+        self._updated = time.monotonic()
+
+    async def __aenter__(self):
+        while True:
+            now = time.monotonic()
+            refill = (now - self._updated) * self.rate / self.period
+            self._tokens = min(self.rate, self._tokens + refill)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return self
+            await asyncio.sleep((1 - self._tokens) * self.period / self.rate)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+# At most 3 OpenAI requests per second; bursts below that are not delayed.
+_openai_limiter = AsyncRateLimiter(3, 1.0)
+# Gemini's per-minute quota is tighter, so it gets its own bucket.
+_gemini_limiter = AsyncRateLimiter(60, 60.0)
+
+# API responses reused across runs live in one SQLite file. Gemini and OpenAI
+# summaries are kept this long (seconds), keyed by a hash of (model, system
+# prompt, user prompt); it is also the longest TTL of anything in the file.
+RESPONSE_CACHE_PATH = os.path.join(CACHE_DIR, "cache.db")
+LLM_CACHE_TTL = 86400
+
+# Opt-in (SEMANTIC_CACHE=1): a Gemini or OpenAI summary is also reused for a
+# reworded version of the same story when the embeddings are at least this similar.
+SEMANTIC_CACHE_MODEL = "text-embedding-3-small"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+# Each provider's summaries are matched against its own table.
+SEMANTIC_CACHE_TABLES = {"gemini": "gemini_embeddings", "openai": "embeddings"}
+
+# Once a key passes a live check, later runs skip the check for this long (seconds).
+KEY_CHECK_TTL = 86400
+_key_check_cache = JsonTTLCache("keys_ok.json", KEY_CHECK_TTL)
+
+# Markdown code fences some models wrap around JSON replies.
+_CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+@dataclass(frozen=True)
+class Article:
+    """One NewsAPI headline, decoded once so later steps use plain attributes."""
+    title: str
+    url: str
+    author: Optional[str]
+    image_url: Optional[str]
+    description: Optional[str]
+
+    @classmethod
+    def from_newsapi(cls, raw):
+        return cls(
+            title=raw.get('title') or 'No Title Found',
+            url=raw.get('url') or '#',
+            author=raw.get('author', 'N/A'),
+            image_url=raw.get('urlToImage', None),
+            description=raw.get('description'),
+        )
+
+# Ordinal suffix for each day of the month (index 0 is unused).
+_ORDINAL_SUFFIXES = tuple(
+    'th' if 10 <= day <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    for day in range(32)
+)
+
 def get_ordinal_date(d):
     """
     Formats a date object as 'Month DaySfx, Year' 
     (e.g., November 3rd, 2025)
     """
     day = d.day
-    # Suffix logic
-    if 10 <= day % 100 <= 20:
-        suffix = 'th'
-    else:
-        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
-    
     # Format: %B = Full month name, %Y = 4-digit year
-    return d.strftime(f'%B {day}{suffix}, %Y')
+    return d.strftime(f'%B {day}{_ORDINAL_SUFFIXES[day]}, %Y')
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Settings read from the environment / .env file once, at startup."""
+    gemini_api_key: str
+    openai_api_key: str
+    news_api_key: str
+    email_sender: str
+    email_app_password: str
+    email_receiver: str
+    email_host: str
+    email_port: int
+    openai_model: str = DEFAULT_OPENAI_MODEL
+    openai_fallback_model: str = DEFAULT_OPENAI_FALLBACK_MODEL
+    hedge_gemini: bool = False
+    semantic_cache: bool = False
+    openai_concurrency: int = OPENAI_MAX_CONCURRENCY
+    gemini_concurrency: int = GEMINI_MAX_CONCURRENCY
+
+REQUIRED_ENV_VARS = (
+    "GEMINI_API_KEY", "OPENAI_API_KEY", "NEWS_API_KEY",
+    "EMAIL_SENDER", "EMAIL_APP_PASSWORD", "EMAIL_RECEIVER", "EMAIL_HOST", "EMAIL_PORT",
+)
 
 def load_environment():
-    """Loads API keys and email config from .env file."""
+    """
+    Loads API keys and email config from .env file.
+    Returns a Config, or None if a required variable is missing or invalid.
+    """
     load_dotenv()
     
-    api_keys = ["GEMINI_API_KEY", "OPENAI_API_KEY", "NEWS_API_KEY"]
-    missing_keys = [k for k in api_keys if k not in os.environ]
-    if missing_keys:
-        print(f"Error: .env file missing: {', '.join(missing_keys)}", file=sys.stderr)
-        return False
-        
-    email_vars = ["EMAIL_SENDER", "EMAIL_APP_PASSWORD", "EMAIL_RECEIVER", "EMAIL_HOST", "EMAIL_PORT"]
-    missing_vars = [v for v in email_vars if v not in os.environ]
-    if missing_vars:
-        print(f"Error: .env file is missing the following email variables: {', '.join(missing_vars)}", file=sys.stderr)
-        print("Please see the guide on how to set these up.", file=sys.stderr)
-        return False
+    # Checked in one pass so a single run reports everything that's missing.
+    missing = [v for v in REQUIRED_ENV_VARS if v not in os.environ]
+    if missing:
+        logger.error(f"Error: .env file is missing the following variables: {', '.join(missing)}")
+        if any(v.startswith("EMAIL_") for v in missing):
+            logger.error("Please see the guide on how to set up the email variables.")
+        return None
+    
+    try:
+        email_port = int(os.environ["EMAIL_PORT"])
+    except ValueError:
+        logger.error(f"Error: EMAIL_PORT must be a number, got '{os.environ['EMAIL_PORT']}'.")
+        return None
+    
+    concurrency = {}
+    for var, default in (("OPENAI_CONCURRENCY", OPENAI_MAX_CONCURRENCY), ("GEMINI_CONCURRENCY", GEMINI_MAX_CONCURRENCY)):
+        value = os.environ.get(var, str(default))
+        if not value.isdigit() or int(value) < 1:
+            logger.error(f"Error: {var} must be a positive whole number, got '{value}'.")
+            return None
+        concurrency[var] = int(value)
         
-    return True
+    return Config(
+        gemini_api_key=os.environ["GEMINI_API_KEY"],
+        openai_api_key=os.environ["OPENAI_API_KEY"],
+        news_api_key=os.environ["NEWS_API_KEY"],
+        email_sender=os.environ["EMAIL_SENDER"],
+        email_app_password=os.environ["EMAIL_APP_PASSWORD"],
+        email_receiver=os.environ["EMAIL_RECEIVER"],
+        email_host=os.environ["EMAIL_HOST"],
+        email_port=email_port,
+        openai_model=os.environ.get("OPENAI_MODEL", DEFAULT_OPENAI_MODEL),
+        openai_fallback_model=os.environ.get("OPENAI_FALLBACK_MODEL", DEFAULT_OPENAI_FALLBACK_MODEL),
+        hedge_gemini=os.environ.get("HEDGE_GEMINI") == "1",
+        semantic_cache=os.environ.get("SEMANTIC_CACHE") == "1",
+        openai_concurrency=concurrency["OPENAI_CONCURRENCY"],
+        gemini_concurrency=concurrency["GEMINI_CONCURRENCY"],
+    )
+
+def key_recently_validated(provider, key):
+    """True if this exact key passed a live check within KEY_CHECK_TTL."""
+    return bool(_key_check_cache.get(f"{provider}:{key_fingerprint(key)}"))
+
+def record_key_check(provider, key, ok):
+    """Remembers a passing check, or forgets it after a failure."""
+    if ok:
+        _key_check_cache.set(f"{provider}:{key_fingerprint(key)}", True)
+    else:
+        _key_check_cache.delete(f"{provider}:{key_fingerprint(key)}")
 
-def check_gemini():
+def is_gemini_auth_error(e):
+    """True if a Gemini exception means the API key was rejected."""
+    from google.api_core import exceptions as google_exceptions  # loaded with the Gemini SDK
+    if isinstance(e, (google_exceptions.Unauthenticated, google_exceptions.PermissionDenied)):
+        return True
+    return isinstance(e, google_exceptions.InvalidArgument) and "API key" in str(e)
+
+def is_gemini_permanent_error(e):
+    """
+    True if retrying the same Gemini request can't help (bad request, unknown
+    model, unsupported region). Rate limits, timeouts and 5xx are retried.
     """
-    Checks if the Gemini API key is valid using the modern genai.GenerativeModel.
+    from google.api_core import exceptions as google_exceptions  # loaded with the Gemini SDK
+    return isinstance(e, (google_exceptions.InvalidArgument,
+                          google_exceptions.NotFound,
+                          google_exceptions.FailedPrecondition))
+
+def check_gemini(cfg, force=False):
+    """
+    Sets up the Gemini model and checks that the API key is valid by looking
+    up the model's metadata (no tokens are generated).
+    The live check is skipped if the key passed one recently, unless force is set.
+    Returns (ok, log) where log is a list of (level, message) pairs.
     """
     global gemini_model
-    gemini_key = os.environ.get("GEMINI_API_KEY")
+    gemini_key = cfg.gemini_api_key
     if not gemini_key:
-        print("Error: GEMINI_API_KEY not set.", file=sys.stderr)
-        return False
+        return False, [(logging.ERROR, "Error: GEMINI_API_KEY not set.")]
+    log = [(logging.INFO, "Authenticating with Gemini...")]
     try:
-        print("Authenticating with Gemini...")
-        genai.configure(api_key=gemini_key)
+        gemini_model = get_gemini_model(GEMINI_MODEL, gemini_key)
         
-        gemini_model = genai.GenerativeModel('gemini-2.5-pro')
+        if not force and key_recently_validated("gemini", gemini_key):
+            log.append((logging.INFO, "Gemini API Check: SKIPPED (key validated recently)"))
+            return True, log
         
-        safety_settings = {
-            'HATE': 'BLOCK_NONE',
-            'HARASSMENT': 'BLOCK_NONE',
-            'SEXUAL': 'BLOCK_NONE',
-            'DANGEROUS': 'BLOCK_NONE'
-        }
-
-        response = gemini_model.generate_content(
-            "Hello",
-            safety_settings=safety_settings
-        )
-        
-        if response.text:
-            print("Gemini API Check: SUCCESS")
-            return True
-        
-        if response.prompt_feedback.block_reason:
-            print(f"Gemini API Check: FAILED (Blocked: {response.prompt_feedback.block_reason})", file=sys.stderr)
-            return False
-            
-        print("Gemini API Check: FAILED (No response text)", file=sys.stderr)
-        return False
+        # A model metadata lookup validates the key without a billed generation.
+        load_genai().get_model(f"models/{GEMINI_MODEL}", request_options=GEMINI_REQUEST_OPTIONS)
+        record_key_check("gemini", gemini_key, True)
+        log.append((logging.INFO, "Gemini API Check: SUCCESS"))
+        return True, log
     except Exception as e:
-        print(f"Gemini API Check FAILED: {e}", file=sys.stderr)
-        return False
+        log.append((logging.ERROR, f"Gemini API Check FAILED: {e}"))
+        return False, log
 
-def check_openai():
-    """Checks if the OpenAI API key is valid."""
+def check_openai(cfg, force=False):
+    """
+    Sets up the async client used for the summaries and checks that the
+    OpenAI API key is valid by retrieving the summary model's metadata
+    (no tokens are generated). The live check is skipped if the key passed
+    one recently, unless force is set.
+    Returns (ok, log) where log is a list of (level, message) pairs.
+    """
     global openai_client
-    openai_key = os.environ.get("OPENAI_API_KEY")
+    openai_key = cfg.openai_api_key
     if not openai_key:
-        print("Error: OPENAI_API_KEY not set.", file=sys.stderr)
-        return False
+        return False, [(logging.ERROR, "Error: OPENAI_API_KEY not set.")]
+    log = [(logging.INFO, "Authenticating with OpenAI...")]
     try:
-        print("Authenticating with OpenAI...")
-        openai_client = openai.OpenAI(api_key=openai_key)
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "Hello"}],
-            max_tokens=5
-        )
-        if response.choices[0].message.content:
-            print("OpenAI API Check: SUCCESS")
-            return True
-        print("OpenAI API Check: FAILED (No response text)", file=sys.stderr)
-        return False
+        openai = load_openai()
+        # Retries for the summaries are handled in get_openai_perspective_async.
+        openai_client = openai.AsyncOpenAI(api_key=openai_key, timeout=OPENAI_TIMEOUT, max_retries=0)
+        
+        if not force and key_recently_validated("openai", openai_key):
+            log.append((logging.INFO, "OpenAI API Check: SKIPPED (key validated recently)"))
+            return True, log
+        
+        # A model metadata lookup validates the key without a billed completion.
+        # No SDK retries, so the check finishes well inside CHECK_TIMEOUT.
+        check_client = openai.OpenAI(api_key=openai_key, timeout=OPENAI_TIMEOUT, max_retries=0)
+        check_client.models.retrieve(cfg.openai_model)
+        record_key_check("openai", openai_key, True)
+        log.append((logging.INFO, "OpenAI API Check: SUCCESS"))
+        return True, log
     except Exception as e:
-        print(f"OpenAI API Check FAILED: {e}", file=sys.stderr)
-        return False
+        log.append((logging.ERROR, f"OpenAI API Check FAILED: {e}"))
+        return False, log
+
+def newsapi_cache_key(cfg, params):
+    """Response-cache key for a NewsAPI query (the key is only fingerprinted)."""
+    query = f"{params['country']}:{params['pageSize']}"
+    return f"newsapi:{key_fingerprint(cfg.news_api_key)}:{query}"
 
-def fetch_news_from_newsapi():
+def fetch_news_from_newsapi(cfg):
     """
     STEP 1: Fetches top headlines from NewsAPI.org.
+    Returns a list of Article, or [] on failure.
     """
-    print("Step 1: Fetching reliable news from NewsAPI.org...")
-    api_key = os.environ.get("NEWS_API_KEY")
-    url = f"https://newsapi.org/v2/top-headlines?country=us&pageSize=5&apiKey={api_key}"
+    logger.info("Step 1: Fetching reliable news from NewsAPI.org...")
+    params = {'country': 'us', 'pageSize': 5, 'apiKey': cfg.news_api_key}
+    cache_key = newsapi_cache_key(cfg, params)
+    
+    cached = _response_cache_get(cache_key, NEWSAPI_CACHE_TTL)
+    if cached:
+        articles = _json_loads(cached)
+        logger.info(f"NewsAPI fetch SUCCEEDED. Using {len(articles)} cached articles from the last {NEWSAPI_CACHE_TTL // 60} min.")
+        return [Article.from_newsapi(raw) for raw in articles]
     
     try:
-        response = requests.get(url, timeout=10)
+        response = _SESSION.get(NEWSAPI_URL, params=params, timeout=10)
         response.raise_for_status() 
-        data = response.json()
+        data = _json_loads(response.content)
         
         if data.get('status') == 'ok' and data.get('articles'):
-            print(f"NewsAPI fetch SUCCEEDED. Found {len(data['articles'])} articles.")
-            return data['articles']
+            logger.info(f"NewsAPI fetch SUCCEEDED. Found {len(data['articles'])} articles.")
+            _response_cache_set(cache_key, _json_dumps(data['articles']))
+            return [Article.from_newsapi(raw) for raw in data['articles']]
         elif data.get('status') == 'error':
-            print(f"NewsAPI Error: {data.get('message')}", file=sys.stderr)
+            logger.error(f"NewsAPI Error: {data.get('message')}")
             return []
         else:
-            print("NewsAPI fetch FAILED: No articles found.", file=sys.stderr)
+            logger.error("NewsAPI fetch FAILED: No articles found.")
             return []
             
     except requests.exceptions.RequestException as e:
-        print(f"NewsAPI fetch FAILED: {e}", file=sys.stderr)
+        logger.error(f"NewsAPI fetch FAILED: {e}")
+        return []
+    except ValueError as e:  # json/orjson JSONDecodeError
+        logger.error(f"NewsAPI fetch FAILED: Response was not valid JSON. {e}")
         return []
 
-def get_gemini_perspective(base_summary, article_title):
+def extract_json_object(text):
+    """
+    Parses a JSON object out of a model reply, tolerating code fences or
+    stray prose around it. Raises ValueError if no valid object is found.
+    """
+    text = _CODE_FENCE_RE.sub("", text)
+    try:
+        return _json_loads(text)
+    except ValueError:
+        # Slice from the first '{' to the last '}' (linear time, no regex backtracking).
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return _json_loads(text[start:end + 1])
+
+def _llm_cache_key(model, system, user):
+    """Stable key for a (model, system prompt, user prompt) triple."""
+    return hashlib.blake2b(f"{model}|{system}|{user}".encode("utf-8")).hexdigest()
+
+# One connection per process, shared by the event loop and the worker threads.
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+def _open_response_cache():
+    """
+    Returns the response cache connection. The first call creates the file
+    and tables and deletes rows older than LLM_CACHE_TTL.
+    Callers must hold _cache_lock.
+    """
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(RESPONSE_CACHE_PATH, timeout=5, check_same_thread=False)
+        try:
+            # WAL lets readers and a writer use the file at once (and persists once set).
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)")
+            for table in SEMANTIC_CACHE_TABLES.values():
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, vector BLOB, response TEXT, ts INTEGER)")
+            # Expired rows are never read again; dropping them keeps the file
+            # and the semantic-cache scans from growing run after run.
+            cutoff = int(time.time()) - LLM_CACHE_TTL
+            with conn:
+                for table in ("cache", *SEMANTIC_CACHE_TABLES.values()):
+                    conn.execute(f"DELETE FROM {table} WHERE ts <= ?", (cutoff,))
+        except sqlite3.Error:
+            conn.close()
+            raise
+        atexit.register(conn.close)
+        _cache_conn = conn
+    return _cache_conn
+
+def _response_cache_get(key, ttl=LLM_CACHE_TTL):
+    """Returns a cached response younger than ttl seconds, or None."""
+    try:
+        with _cache_lock:
+            row = _open_response_cache().execute(
+                "SELECT response FROM cache WHERE key = ? AND ts > ?",
+                (key, int(time.time()) - ttl)
+            ).fetchone()
+    except (OSError, sqlite3.Error):
+        return None  # Missing or unreadable cache is just a miss
+    return row[0] if row else None
+
+def _response_cache_set(key, response):
+    """Stores a response with the current timestamp. Failures are ignored."""
+    try:
+        with _cache_lock:
+            conn = _open_response_cache()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, response, ts) VALUES (?, ?, ?)",
+                    (key, response, int(time.time()))
+                )
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Warning: Could not write response cache. {e}")
+
+# (base_summary, title) -> Future of its embedding (None if the request failed),
+# so the Gemini and OpenAI lookups share one embedding request per article.
+_embedding_futures = {}
+
+async def embed_articles(items):
+    """
+    Embeds each (base_summary, title) pair, in one OpenAI request for the
+    pairs that haven't been embedded yet this run.
+    Returns a list of vectors in the same order, or None on failure.
+    """
+    loop = asyncio.get_running_loop()
+    new = [item for item in dict.fromkeys(items) if item not in _embedding_futures]
+    for item in new:
+        _embedding_futures[item] = loop.create_future()
+    if new:
+        try:
+            async with _openai_limiter:
+                response = await openai_client.embeddings.create(
+                    model=SEMANTIC_CACHE_MODEL,
+                    input=[f"{title}\n{summary}" for summary, title in new]
+                )
+            for item, entry in zip(new, response.data):
+                _embedding_futures[item].set_result(entry.embedding)
+        except Exception as e:
+            logger.warning(f"Warning: Embedding request FAILED ({e}). Skipping the semantic cache.")
+        finally:
+            # A short reply or a cancelled request must not leave the other
+            # provider waiting on these forever.
+            for item in new:
+                if not _embedding_futures[item].done():
+                    _embedding_futures[item].set_result(None)
+    vectors = [await _embedding_futures[item] for item in items]
+    return None if any(vector is None for vector in vectors) else vectors
+
+def _semantic_cache_lookup(provider, vector):
+    """
+    Returns provider's cached summary whose embedding is most similar to
+    vector, if that similarity reaches SEMANTIC_CACHE_THRESHOLD, else None.
+    """
+    try:
+        with _cache_lock:
+            rows = _open_response_cache().execute(
+                f"SELECT vector, response FROM {SEMANTIC_CACHE_TABLES[provider]} WHERE ts > ?",
+                (int(time.time()) - LLM_CACHE_TTL,)
+            ).fetchall()
+    except (OSError, sqlite3.Error):
+        return None
+    best_score, best_response = 0.0, None
+    for blob, response in rows:
+        # OpenAI embeddings are unit length, so the dot product is the cosine similarity.
+        score = sum(a * b for a, b in zip(vector, array('f', blob)))
+        if score > best_score:
+            best_score, best_response = score, response
+    return best_response if best_score >= SEMANTIC_CACHE_THRESHOLD else None
+
+def _semantic_cache_set(provider, key, vector, response):
+    """Stores an embedding with provider's summary. Failures are ignored."""
+    try:
+        with _cache_lock:
+            conn = _open_response_cache()
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {SEMANTIC_CACHE_TABLES[provider]} (key, vector, response, ts) VALUES (?, ?, ?, ?)",
+                    (key, array('f', vector).tobytes(), response, int(time.time()))
+                )
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Warning: Could not write semantic cache. {e}")
+
+async def _semantic_cache_fill(cfg, provider, label, items, missing, results):
+    """
+    Fills results[idx] from provider's semantic cache for the indexes in
+    missing that have a similar enough cached story, removing them from missing.
+    Returns {idx: vector} for the embedded items (empty if the cache is off).
+    """
+    if not (missing and openai_client and cfg.semantic_cache):
+        return {}
+    embedded = await embed_articles([items[idx] for idx in missing])
+    if not embedded:
+        return {}
+    vectors = dict(zip(missing, embedded))
+    for idx in list(missing):
+        similar = _semantic_cache_lookup(provider, vectors[idx])
+        if similar:
+            logger.info(f"{label}: Using cached summary of a similar story for '{items[idx][1]}'.")
+            results[idx] = similar
+            missing.remove(idx)
+    return vectors
+
+def _semantic_cache_store(provider, vectors, keys, summaries):
+    """
+    Adds the new summaries to provider's semantic cache. Only summaries that
+    made it into the exact cache are real replies, not error text.
+    """
+    for idx, key in keys.items():
+        if idx in vectors and _response_cache_get(key):
+            _semantic_cache_set(provider, key, vectors[idx], summaries[idx])
+
+OPENAI_SYSTEM_PROMPT = "You are a news summarization assistant. You will be given a news headline and a summary. Rewrite that summary in your own words, maintaining a concise and strictly neutral, factual tone."
+
+def openai_user_prompt(base_summary, article_title):
+    """The per-article user message for the OpenAI summary."""
+    return f"Please provide a one-paragraph, neutral summary based on the following information:\n\nHeadline: {article_title}\n\nSummary: {base_summary}"
+
+def openai_cache_key(cfg, base_summary, article_title):
+    """
+    Cache key for an article's OpenAI summary. It uses the configured primary
+    model, so a reply from the fallback model is found by the next lookup too.
+    """
+    return _llm_cache_key(cfg.openai_model, OPENAI_SYSTEM_PROMPT,
+                          openai_user_prompt(base_summary, article_title))
+
+async def hedged(call, n=2):
+    """
+    Runs n copies of the coroutine function `call` concurrently and returns
+    whichever result arrives first. Raises only if every copy fails.
+    Used to trim tail latency.
+    """
+    pending = {asyncio.ensure_future(call()) for _ in range(n)}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Cancel the slower copies' requests.
+        for task in pending:
+            task.cancel()
+
+def gemini_cache_key(base_summary, article_title):
+    """Cache key for an article's Gemini summary (that of its single-article prompt)."""
+    prompt = GEMINI_PROMPT_TEMPLATE.format(article_title=article_title, base_summary=base_summary)
+    return _llm_cache_key(GEMINI_MODEL, "", prompt)
+
+async def get_gemini_perspective(cfg, base_summary, article_title, semaphore):
     """
     Step 2a: Uses Gemini to provide a summary "perspective" with retries.
+    The semaphore caps how many requests are in flight at once.
     """
     global gemini_model 
     if not gemini_model:
-        print("Error: Gemini model not initialized.", file=sys.stderr)
+        logger.error("Error: Gemini model not initialized.")
         return "Gemini summary could not be generated."
         
-    print(f"Step 2a: Sending summary for '{article_title}' to Gemini (with retries)...")
-    
-    prompt = f"""
-    You are a text transformation assistant.
-    Your ONLY task is to rewrite the provided "Base Summary" into a single, neutral paragraph.
-    
-    IMPORTANT:
-    1. DO NOT use any external knowledge.
-    2. DO NOT fact-check the information.
-    3. You MUST assume the "Base Summary" is the absolute source of truth for this task, even if it seems incorrect.
-    4. Your output must be a concise rewrite of the summary, maintaining a strictly neutral, factual tone.
-
-    Headline: {article_title}
-    Base Summary: {base_summary}
+    logger.info(f"Step 2a: Sending summary for '{article_title}' to Gemini (with retries)...")
     
-    Rewritten Summary:
-    """
+    prompt = GEMINI_PROMPT_TEMPLATE.format(article_title=article_title, base_summary=base_summary)
     
-    generation_config = genai.GenerationConfig(
-        temperature=0.6,
-        top_p=1.0,
-        top_k=1
-    )
+    cache_key = gemini_cache_key(base_summary, article_title)
+    cached = _response_cache_get(cache_key)
+    if cached:
+        logger.info(f"Step 2a: Using cached Gemini summary for '{article_title}'.")
+        return cached
     
-    safety_settings = {
-        'HATE': 'BLOCK_NONE',
-        'HARASSMENT': 'BLOCK_NONE',
-        'SEXUAL': 'BLOCK_NONE',
-        'DANGEROUS': 'BLOCK_NONE'
-    }
+    async def generate():
+        async with _gemini_limiter:
+            return await gemini_model.generate_content_async(
+                prompt,
+                generation_config=GEMINI_GENERATION_CONFIG,
+                safety_settings=GEMINI_SAFETY_SETTINGS,
+                request_options=GEMINI_REQUEST_OPTIONS
+            )
+
+    # Opt-in: send two identical requests and keep the faster one (~2x token cost).
+    hedge = cfg.hedge_gemini
 
     max_retries = 3
     wait_time = 2
 
     for attempt in range(max_retries):
         try:
-            response = gemini_model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
+            async with semaphore:
+                response = await (hedged(generate) if hedge else generate())
             
             if response.text:
                 if "overloaded" in response.text.lower() or "try again" in response.text.lower():
-                    print(f"Gemini attempt {attempt + 1} FAILED: Model reported overload. Retrying...")
+                    logger.info(f"Gemini attempt {attempt + 1} FAILED: Model reported overload. Retrying...")
                 else:
-                    print(f"Gemini attempt {attempt + 1} SUCCEEDED.")
-                    return response.text.strip()
+                    logger.info(f"Gemini attempt {attempt + 1} SUCCEEDED.")
+                    summary = response.text.strip()
+                    _response_cache_set(cache_key, summary)
+                    return summary
             
             elif response.prompt_feedback.block_reason:
-                print(f"Gemini attempt {attempt + 1} FAILED: Blocked ({response.prompt_feedback.block_reason}).", file=sys.stderr)
+                logger.error(f"Gemini attempt {attempt + 1} FAILED: Blocked ({response.prompt_feedback.block_reason}).")
                 return f"Summary generation blocked by Gemini safety filters ({response.prompt_feedback.block_reason})."
             
             else:
-                print(f"Gemini attempt {attempt + 1} FAILED: No content in response.")
+                logger.info(f"Gemini attempt {attempt + 1} FAILED: No content in response.")
 
         except Exception as e:
-            print(f"Gemini attempt {attempt + 1} FAILED with exception: {e}", file=sys.stderr)
+            if is_gemini_auth_error(e):
+                # No point retrying a rejected key; make the next run re-check it.
+                record_key_check("gemini", cfg.gemini_api_key, False)
+                logger.error(f"Gemini summary FAILED: API key rejected ({e}). Check GEMINI_API_KEY.")
+                return "Summary could not be generated by Gemini (invalid API key)."
+            if is_gemini_permanent_error(e):
+                logger.error(f"Gemini summary FAILED: {e}")
+                return "Summary could not be generated by Gemini."
+            logger.error(f"Gemini attempt {attempt + 1} FAILED with exception: {e}")
         
         if attempt < max_retries - 1:
-            print(f"Waiting {wait_time}s before next retry...")
-            time.sleep(wait_time)
+            logger.info(f"Waiting {wait_time}s before next retry...")
+            await asyncio.sleep(wait_time)
             wait_time *= 2
     
-    print(f"Gemini summary FAILED after {max_retries} attempts.", file=sys.stderr)
+    logger.error(f"Gemini summary FAILED after {max_retries} attempts.")
     return "Summary could not be generated by Gemini after multiple attempts."
 
-def get_openai_perspective(base_summary, article_title):
+async def _summarize_unique(summarize, cfg, items):
+    """
+    Runs summarize(cfg, items) on the distinct items only, so a story NewsAPI
+    lists twice costs one request, then maps the results back onto items.
+    """
+    unique = list(dict.fromkeys(items))
+    by_item = dict(zip(unique, await summarize(cfg, unique)))
+    return [by_item[item] for item in items]
+
+async def get_gemini_perspectives_batch(cfg, items):
+    """
+    Step 2a (batch): Rewrites every (base_summary, title) pair in a single
+    Gemini request that answers in JSON.
+    Transient errors (rate limits, 5xx, timeouts) retry the whole batch.
+    Returns the summaries in the same order as items, with None for any item
+    the reply has no rewrite for, or None if Gemini rejects the request or the
+    reply can't be read.
+    """
+    if not gemini_model:
+        return None
+    
+    logger.info(f"Step 2a: Sending {len(items)} summaries to Gemini in one request...")
+    payload = _json_dumps([
+        {"id": idx, "headline": title, "summary": summary}
+        for idx, (summary, title) in enumerate(items)
+    ])
+    request_options = {**GEMINI_REQUEST_OPTIONS, 'timeout': GEMINI_TIMEOUT + BATCH_TIMEOUT_PER_ITEM * len(items)}
+    
+    async def generate():
+        async with _gemini_limiter:
+            return await gemini_model.generate_content_async(
+                GEMINI_BATCH_PROMPT + payload,
+                generation_config=GEMINI_BATCH_GENERATION_CONFIG,
+                safety_settings=GEMINI_SAFETY_SETTINGS,
+                request_options=request_options
+            )
+    
+    wait_time = 2
+    for attempt in range(BATCH_MAX_RETRIES):
+        try:
+            # HEDGE_GEMINI=1 races two copies of the batch, as for single requests.
+            response = await (hedged(generate) if cfg.hedge_gemini else generate())
+            break
+        except Exception as e:
+            if is_gemini_auth_error(e):
+                record_key_check("gemini", cfg.gemini_api_key, False)
+                logger.error(f"Gemini summary FAILED: API key rejected ({e}). Check GEMINI_API_KEY.")
+                return ["Summary could not be generated by Gemini (invalid API key)."] * len(items)
+            if is_gemini_permanent_error(e):
+                logger.warning(f"Warning: Batched Gemini request FAILED ({e}). Falling back to one request per article.")
+                return None
+            if attempt == BATCH_MAX_RETRIES - 1:
+                logger.error(f"Batched Gemini request FAILED after {BATCH_MAX_RETRIES} attempts ({e}).")
+                return ["Summary could not be generated by Gemini after multiple attempts."] * len(items)
+            logger.error(f"Batched Gemini attempt {attempt + 1} FAILED ({e}). Waiting {wait_time}s before next retry...")
+            await asyncio.sleep(wait_time)
+            wait_time *= 2
+    
+    try:
+        rewrites = _json_loads(response.text)["rewrites"]
+        by_id = {entry["id"]: entry["rewrite"].strip() for entry in rewrites}
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Warning: Batched Gemini reply could not be read ({e}). Falling back to one request per article.")
+        return None
+    
+    summaries = [by_id.get(idx) or None for idx in range(len(items))]
+    if None in summaries:
+        logger.warning(f"Warning: Batched Gemini reply was missing {summaries.count(None)} of {len(items)} rewrites. Requesting those one per article.")
+    for (summary, title), rewrite in zip(items, summaries):
+        if rewrite:
+            _response_cache_set(gemini_cache_key(summary, title), rewrite)
+    return summaries
+
+async def get_gemini_perspectives(cfg, items):
+    """
+    Step 2a: Gets a Gemini summary for every (base_summary, title) pair.
+    Cached summaries are reused and the rest go out as one batched request;
+    any the batch doesn't cover are sent concurrently, one per article
+    (up to cfg.gemini_concurrency at a time).
+    Returns the summaries in the same order as items.
+    """
+    if len(set(items)) < len(items):
+        return await _summarize_unique(get_gemini_perspectives, cfg, items)
+    results = [None] * len(items)
+    missing = []
+    for idx, (summary, title) in enumerate(items):
+        cached = _response_cache_get(gemini_cache_key(summary, title))
+        if cached:
+            logger.info(f"Step 2a: Using cached Gemini summary for '{title}'.")
+            results[idx] = cached
+        else:
+            missing.append(idx)
+    
+    vectors = await _semantic_cache_fill(cfg, "gemini", "Step 2a (Gemini)", items, missing, results)
+    if not missing:
+        return results
+    
+    pending = [items[idx] for idx in missing]
+    summaries = await get_gemini_perspectives_batch(cfg, pending) if len(pending) > 1 else None
+    if summaries is None:
+        summaries = [None] * len(pending)
+    # Whatever the batch didn't cover goes out one request per article.
+    retry = [pos for pos, summary in enumerate(summaries) if summary is None]
+    if retry:
+        semaphore = asyncio.Semaphore(cfg.gemini_concurrency)
+        redone = await asyncio.gather(
+            *[get_gemini_perspective(cfg, *pending[pos], semaphore) for pos in retry]
+        )
+        for pos, summary in zip(retry, redone):
+            summaries[pos] = summary
+    
+    for idx, summary in zip(missing, summaries):
+        results[idx] = summary
+    _semantic_cache_store("gemini", vectors, {idx: gemini_cache_key(*items[idx]) for idx in missing}, results)
+    return results
+
+def openai_retry_delay(e, default):
+    """
+    Seconds to wait before retrying after e: the server's Retry-After if it
+    sent one (capped at MAX_RETRY_AFTER), else default.
+    """
+    response = getattr(e, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), MAX_RETRY_AFTER) if retry_after else default
+    except ValueError:
+        return default
+
+async def get_openai_perspective_async(cfg, base_summary, article_title, semaphore, model=None):
     """
     Step 2b: Uses OpenAI to provide a "second opinion" summary.
+    An empty reply is retried once on the fallback model.
+    The semaphore caps how many requests are in flight at once, and the
+    rate limiter spaces them out. Rate-limit, 5xx, timeout and connection errors
+    are retried, honoring the server's Retry-After header when present.
+    Successful summaries are cached on disk so reruns skip the API call.
     """
     global openai_client
+    cache_key = openai_cache_key(cfg, base_summary, article_title)
+    cached = _response_cache_get(cache_key)
+    if cached:
+        logger.info(f"Step 2b: Using cached OpenAI summary for '{article_title}'.")
+        return cached
+    
     if not openai_client:
-        print("Error: OpenAI client not initialized.", file=sys.stderr)
+        logger.error("Error: OpenAI client not initialized.")
         return "OpenAI summary could not be generated."
+    
+    openai = load_openai()
+    fallback_model = cfg.openai_fallback_model
+    model = model or cfg.openai_model
         
-    print(f"Step 2b: Sending summary for '{article_title}' to OpenAI...")
+    logger.info(f"Step 2b: Sending summary for '{article_title}' to OpenAI ({model})...")
+    
+    max_retries = 3
+    wait_time = 2
+    
+    for attempt in range(max_retries):
+        try:
+            async with semaphore, _openai_limiter:
+                response = await openai_client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+                        {"role": "user", "content": openai_user_prompt(base_summary, article_title)}
+                    ],
+                    max_tokens=150,
+                    temperature=0.5
+                )
+            summary = (response.choices[0].message.content or "").strip()
+            if summary:
+                _response_cache_set(cache_key, summary)
+                return summary
+            elif model != fallback_model:
+                logger.warning(f"Warning: {model} returned an empty summary. Retrying with {fallback_model}...")
+                return await get_openai_perspective_async(cfg, base_summary, article_title, semaphore, model=fallback_model)
+            else:
+                logger.error("OpenAI summary FAILED: No usable content in response.")
+                return "Summary could not be generated by OpenAI."
+        except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+            if attempt == max_retries - 1:
+                break
+            delay = openai_retry_delay(e, wait_time)
+            logger.error(f"OpenAI attempt {attempt + 1} FAILED ({type(e).__name__}). Waiting {delay}s before next retry...")
+            await asyncio.sleep(delay)
+            wait_time *= 2
+        except openai.AuthenticationError as e:
+            # Make the next run re-check the key instead of trusting the cache.
+            record_key_check("openai", cfg.openai_api_key, False)
+            logger.error(f"OpenAI summary FAILED: API key rejected ({e}). Check OPENAI_API_KEY.")
+            return "Summary could not be generated by OpenAI (invalid API key)."
+        except Exception as e:
+            logger.error(f"OpenAI summary FAILED: {e}")
+            return "Summary could not be generated by OpenAI."
+    
+    logger.error(f"OpenAI summary FAILED after {max_retries} attempts.")
+    return "Summary could not be generated by OpenAI."
+
+async def get_openai_perspectives_batch(cfg, items):
+    """
+    Step 2b (batch): Rewrites every (base_summary, title) pair in a single
+    OpenAI request that answers in JSON.
+    Rate limits, 5xx and timeouts retry the whole batch.
+    Returns the summaries in the same order as items, with None for any item
+    the reply has no rewrite for, or None if OpenAI rejects the request or the
+    reply can't be read.
+    """
+    if not openai_client:
+        return None
+        
+    openai = load_openai()
+    model = cfg.openai_model
+    logger.info(f"Step 2b: Sending {len(items)} summaries to OpenAI ({model}) in one request...")
+    payload = _json_dumps([
+        {"id": idx, "headline": title, "summary": summary}
+        for idx, (summary, title) in enumerate(items)
+    ])
+    wait_time = 2
+    for attempt in range(BATCH_MAX_RETRIES):
+        try:
+            async with _openai_limiter:
+                response = await openai_client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "You are a news summarization assistant. You will be given a JSON array of news items, each with an id, a headline and a summary. For each item, rewrite the summary in your own words as one paragraph, maintaining a concise and strictly neutral, factual tone. Reply with a JSON object of the form {\"rewrites\": [{\"id\": <id>, \"rewrite\": <text>}, ...]} containing exactly one entry per input item."},
+                        {"role": "user", "content": payload}
+                    ],
+                    response_format={"type": "json_object"},
+                    max_tokens=150 * len(items),
+                    temperature=0.5,
+                    timeout=OPENAI_TIMEOUT + BATCH_TIMEOUT_PER_ITEM * len(items)
+                )
+            break
+        except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+            if attempt == BATCH_MAX_RETRIES - 1:
+                logger.error(f"Batched OpenAI request FAILED after {BATCH_MAX_RETRIES} attempts ({type(e).__name__}).")
+                return ["Summary could not be generated by OpenAI."] * len(items)
+            delay = openai_retry_delay(e, wait_time)
+            logger.error(f"Batched OpenAI attempt {attempt + 1} FAILED ({type(e).__name__}). Waiting {delay}s before next retry...")
+            await asyncio.sleep(delay)
+            wait_time *= 2
+        except openai.AuthenticationError as e:
+            record_key_check("openai", cfg.openai_api_key, False)
+            logger.error(f"OpenAI summary FAILED: API key rejected ({e}). Check OPENAI_API_KEY.")
+            return ["Summary could not be generated by OpenAI (invalid API key)."] * len(items)
+        except Exception as e:
+            # e.g. a model or OpenAI-compatible server without JSON mode.
+            logger.warning(f"Warning: Batched OpenAI request FAILED ({e}). Falling back to one request per article.")
+            return None
+    
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a news summarization assistant. You will be given a news headline and a summary. Rewrite that summary in your own words, maintaining a concise and strictly neutral, factual tone."},
-                {"role": "user", "content": f"Please provide a one-paragraph, neutral summary based on the following information:\n\nHeadline: {article_title}\n\nSummary: {base_summary}"}
-            ],
-            max_tokens=150,
-            temperature=0.5
-        )
-        if response.choices[0].message.content:
-            return response.choices[0].message.content.strip()
+        rewrites = extract_json_object(response.choices[0].message.content or "")["rewrites"]
+        by_id = {entry["id"]: entry["rewrite"].strip() for entry in rewrites}
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Warning: Batched OpenAI reply could not be read ({e}). Falling back to one request per article.")
+        return None
+    
+    summaries = [by_id.get(idx) or None for idx in range(len(items))]
+    if None in summaries:
+        logger.warning(f"Warning: Batched OpenAI reply was missing {summaries.count(None)} of {len(items)} rewrites. Requesting those one per article.")
+    for (summary, title), rewrite in zip(items, summaries):
+        if rewrite:
+            _response_cache_set(openai_cache_key(cfg, summary, title), rewrite)
+    return summaries
+
+async def get_openai_perspectives(cfg, items):
+    """
+    Step 2b: Gets an OpenAI summary for every (base_summary, title) pair.
+    Cached summaries are reused and the rest go out as one batched request;
+    any the batch doesn't cover are sent concurrently, one per article.
+    Returns the summaries in the same order as items.
+    """
+    if len(set(items)) < len(items):
+        return await _summarize_unique(get_openai_perspectives, cfg, items)
+    results = [None] * len(items)
+    missing = []
+    for idx, (summary, title) in enumerate(items):
+        cached = _response_cache_get(openai_cache_key(cfg, summary, title))
+        if cached:
+            logger.info(f"Step 2b: Using cached OpenAI summary for '{title}'.")
+            results[idx] = cached
         else:
-            print("OpenAI summary FAILED: No content in response.", file=sys.stderr)
-            return "Summary could not be generated by OpenAI."
+            missing.append(idx)
+    
+    vectors = await _semantic_cache_fill(cfg, "openai", "Step 2b (OpenAI)", items, missing, results)
+    if not missing:
+        return results
+    
+    pending = [items[idx] for idx in missing]
+    summaries = await get_openai_perspectives_batch(cfg, pending) if len(pending) > 1 else None
+    if summaries is None:
+        summaries = [None] * len(pending)
+    # Whatever the batch didn't cover goes out one request per article.
+    retry = [pos for pos, summary in enumerate(summaries) if summary is None]
+    if retry:
+        semaphore = asyncio.Semaphore(cfg.openai_concurrency)
+        redone = await asyncio.gather(
+            *[get_openai_perspective_async(cfg, *pending[pos], semaphore) for pos in retry]
+        )
+        for pos, summary in zip(retry, redone):
+            summaries[pos] = summary
+    
+    for idx, summary in zip(missing, summaries):
+        results[idx] = summary
+    _semantic_cache_store("openai", vectors, {idx: openai_cache_key(cfg, *items[idx]) for idx in missing}, results)
+    return results
+
+def shrink_image(data, subtype):
+    """
+    Downscales and re-encodes a large image as JPEG to keep the email small.
+    Returns (data, subtype): the smaller version, or the original if Pillow
+    isn't installed, the image is already small, or shrinking doesn't help.
+    """
+    if Image is None or len(data) < SHRINK_MIN_BYTES or subtype.lower() in ('gif', 'svg+xml'):
+        return data, subtype  # GIFs may be animated; SVGs aren't raster
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            im.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            if im.mode in ('RGBA', 'LA', 'P'):
+                # JPEG has no alpha channel; flatten onto white instead of black.
+                im = im.convert('RGBA')
+                background = Image.new('RGB', im.size, (255, 255, 255))
+                background.paste(im, mask=im.getchannel('A'))
+                im = background
+            out = io.BytesIO()
+            im.convert('RGB').save(out, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
     except Exception as e:
-        print(f"OpenAI summary FAILED: {e}", file=sys.stderr)
-        return "Summary could not be generated by OpenAI."
+        logger.warning(f"Warning: Could not shrink image, attaching the original. {e}")
+        return data, subtype
+    if out.tell() >= len(data):
+        return data, subtype
+    logger.info(f"Shrunk image from {len(data)} to {out.tell()} bytes.")
+    return out.getvalue(), 'jpeg'
 
 def download_image_with_retries(image_url, title):
     """
     Attempts to download an image with retries on failure.
+    The body is streamed and the download is abandoned (not retried) once
+    it exceeds MAX_IMAGE_BYTES, isn't an image, or the server answers with
+    a client error such as 404.
     Returns (image_data, image_subtype) or (None, None)
     """
     max_retries = 3
@@ -272,116 +1144,248 @@ def download_image_with_retries(image_url, title):
 
     for attempt in range(max_retries):
         try:
-            print(f"Downloading image (Attempt {attempt + 1}/{max_retries}): {image_url}")
-            img_response = requests.get(image_url, headers=headers, timeout=10, allow_redirects=True)
-            
-            if img_response.status_code == 200:
-                # Success, now find MIME type
-                subtype = None
-                ctype = img_response.headers.get('Content-Type')
-                
-                if ctype and ctype.startswith('image/'):
-                    subtype = ctype.split('/')[1].split(';')[0].strip()
-                    print(f"MIME type from header: image/{subtype}")
-                
-                if not subtype:
-                    print(f"Warning: No 'Content-Type' header. Falling back to URL extension.")
-                    ctype, _ = mimetypes.guess_type(image_url)
+            logger.info(f"Downloading image (Attempt {attempt + 1}/{max_retries}): {image_url}")
+            started = time.monotonic()
+            with _SESSION.get(image_url, headers=headers, timeout=10, allow_redirects=True, stream=True) as img_response:
+                if img_response.status_code != 200:
+                    logger.warning(f"Warning: Failed to download image (Status {img_response.status_code})")
+                    if 400 <= img_response.status_code < 500 and img_response.status_code not in IMAGE_RETRY_STATUSES:
+                        return (None, None) # A retry would get the same answer
+                else:
+                    # Success, now find MIME type (before reading the body)
+                    subtype = None
+                    ctype = img_response.headers.get('Content-Type')
+                    
                     if ctype and ctype.startswith('image/'):
-                        subtype = ctype.split('/')[1]
-                        print(f"MIME type from extension: image/{subtype}")
+                        subtype = ctype.split('/')[1].split(';')[0].strip()
+                        logger.info(f"MIME type from header: image/{subtype}")
+                    
+                    if not subtype:
+                        logger.warning(f"Warning: No 'Content-Type' header. Falling back to URL extension.")
+                        ctype, _ = mimetypes.guess_type(image_url)
+                        if ctype and ctype.startswith('image/'):
+                            subtype = ctype.split('/')[1]
+                            logger.info(f"MIME type from extension: image/{subtype}")
 
-                if subtype:
+                    if not subtype:
+                        logger.warning(f"Warning: Could not determine a valid image type for {image_url}")
+                        return (None, None) # Failed to find type
                     if subtype.lower() == 'pjpeg':
                         subtype = 'jpeg'
-                    return (img_response.content, subtype) # Success
-                else:
-                    print(f"Warning: Could not determine a valid image type for {image_url}", file=sys.stderr)
-                    return (None, None) # Failed to find type
-            
-            else:
-                print(f"Warning: Failed to download image (Status {img_response.status_code})", file=sys.stderr)
+                    
+                    content_length = img_response.headers.get('Content-Length', '')
+                    if content_length.isdigit() and int(content_length) > MAX_IMAGE_BYTES:
+                        logger.warning(f"Warning: Skipping image {image_url} ({int(content_length)} bytes is over the {MAX_IMAGE_BYTES} byte limit).")
+                        return (None, None)
+                    
+                    data = bytearray()
+                    for chunk in img_response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+                        data += chunk
+                        if len(data) > MAX_IMAGE_BYTES:
+                            logger.warning(f"Warning: Skipping image {image_url} (over the {MAX_IMAGE_BYTES} byte limit).")
+                            return (None, None)
+                        if time.monotonic() - started > IMAGE_ATTEMPT_TIMEOUT:
+                            raise requests.exceptions.Timeout(f"download took over {IMAGE_ATTEMPT_TIMEOUT}s")
+                    return shrink_image(bytes(data), subtype) # Success
         
         except requests.exceptions.RequestException as e:
-            print(f"Warning: Network error downloading image {image_url}. {e}", file=sys.stderr)
+            logger.warning(f"Warning: Network error downloading image {image_url}. {e}")
         
         # Wait before retrying
         if attempt < max_retries - 1:
-            print(f"Waiting {wait_time}s before next retry...")
+            logger.info(f"Waiting {wait_time}s before next retry...")
             time.sleep(wait_time)
             wait_time *= 2 # Exponential backoff
         
-    print(f"Image download FAILED for '{title}' after {max_retries} attempts.", file=sys.stderr)
+    logger.error(f"Image download FAILED for '{title}' after {max_retries} attempts.")
     return (None, None) # Failed all retries
 
-def send_email(subject, html_body, to_email, attachments=None):
+# Many providers cap how many messages one SMTP connection may send, so a
+# session reconnects after this many. A server that stops answering is
+# given up on after SMTP_TIMEOUT seconds per network operation.
+SMTP_MAX_MESSAGES_PER_CONNECTION = 50
+SMTP_TIMEOUT = 15
+
+class SMTPSession:
+    """
+    An authenticated SMTP connection that is opened on first use and reused
+    by later sends. Use it as a context manager, or call close() when done.
+    """
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.server = None
+        self.sent = 0
+
+    def connect(self):
+        """Returns the open connection, connecting and logging in if needed."""
+        if self.server is not None:
+            return self.server
+        
+        logger.info(f"Connecting to email server {self.cfg.email_host}:{self.cfg.email_port}...")
+        server = smtplib.SMTP(self.cfg.email_host, self.cfg.email_port, timeout=SMTP_TIMEOUT)
+        try:
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+            
+            logger.info("Logging in to email server...")
+            server.login(self.cfg.email_sender, self.cfg.email_app_password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.sent = 0
+        return server
+
+    def warm(self):
+        """Connects ahead of time. Errors are ignored here and surface on send()."""
+        try:
+            self.connect()
+        except Exception:
+            pass
+
+    def send(self, msg):
+        """Sends msg. A reused connection the server has dropped is reopened once."""
+        if self.sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            self.close()
+        for attempt in range(2):
+            reused = self.server is not None
+            server = self.connect()
+            try:
+                # Only a connection left open since an earlier call can have gone stale.
+                if reused:
+                    server.noop()
+                server.send_message(msg)
+                self.sent += 1
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                if attempt:
+                    raise
+                logger.warning("Warning: Email server closed the connection. Reconnecting...")
+
+    def close(self):
+        """Sends QUIT and drops the connection, if one is open."""
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def __enter__(self):
+        # Connects lazily, on the first send().
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def send_email(cfg, subject, html_body, to_email, attachments=None, smtp_session=None):
     """
     Step 3: Sends the email using smtplib.
+    Reuses smtp_session if given, otherwise connects just for this email.
     """
-    print("Step 3: Preparing to send HTML email...")
+    logger.info("Step 3: Preparing to send HTML email...")
     
-    sender_email = os.environ.get("EMAIL_SENDER")
-    sender_password = os.environ.get("EMAIL_APP_PASSWORD")
-    host = os.environ.get("EMAIL_HOST")
-    port = int(os.environ.get("EMAIL_PORT", 587)) 
-
-    msg = MIMEMultipart('related')
-    msg['From'] = sender_email
+    msg = EmailMessage()
+    msg['From'] = cfg.email_sender
     msg['To'] = to_email
     msg['Subject'] = subject
     
-    msg.attach(MIMEText(html_body, 'html'))
+    msg.set_content(html_body, subtype='html')
     
     if attachments:
         for cid, (data, subtype) in attachments.items():
             try:
-                img = MIMEImage(data, _subtype=subtype)
-                img.add_header('Content-ID', f'<{cid}>')
-                msg.attach(img)
-                print(f"Attached image with CID: {cid}")
+                # The first related part turns the message into multipart/related.
+                msg.add_related(data, maintype='image', subtype=subtype, cid=f'<{cid}>')
+                logger.info(f"Attached image with CID: {cid}")
             except Exception as e:
-                print(f"Warning: Could not attach image {cid}. {e}", file=sys.stderr)
+                logger.warning(f"Warning: Could not attach image {cid}. {e}")
     
     try:
-        print(f"Connecting to email server {host}:{port}...")
-        server = smtplib.SMTP(host, port)
-        server.ehlo()
-        server.starttls()
-        server.ehlo()
-        
-        print("Logging in to email server...")
-        server.login(sender_email, sender_password)
-        
-        print(f"Sending email to {to_email}...")
-        server.send_message(msg)
+        if smtp_session is None:
+            with SMTPSession(cfg) as session:
+                logger.info(f"Sending email to {to_email}...")
+                session.send(msg)
+        else:
+            logger.info(f"Sending email to {to_email}...")
+            smtp_session.send(msg)
         
-        print("Email sent successfully!")
+        logger.info("Email sent successfully!")
         
     except smtplib.SMTPAuthenticationError:
-        print("Email FAILED: Authentication error.", file=sys.stderr)
-        print("Check your EMAIL_SENDER and EMAIL_APP_PASSWORD.", file=sys.stderr)
+        logger.error("Email FAILED: Authentication error.")
+        logger.error("Check your EMAIL_SENDER and EMAIL_APP_PASSWORD.")
     except Exception as e:
-        print(f"Email FAILED: An error occurred: {e}", file=sys.stderr)
-    finally:
-        if 'server' in locals():
-            server.quit()
+        logger.error(f"Email FAILED: An error occurred: {e}")
+
+
+def _on_run_timeout(signum, frame):
+    """SIGALRM handler: aborts a run that has exceeded RUN_TIMEOUT."""
+    logger.error(f"\nError: Script exceeded {RUN_TIMEOUT}s and was stopped.")
+    sys.exit(1)
 
+def parse_args():
+    """Parses command-line options."""
+    parser = argparse.ArgumentParser(description="Fetch top news, summarize it with Gemini and OpenAI, and email the recap.")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Always run the live Gemini/OpenAI key checks, even if the keys passed one in the last 24 hours."
+    )
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    setup_logging()
+
+    # run() bounds the whole run on every platform, but can only stop it at an
+    # await. Worker threads (NewsAPI, images, SMTP) can't be interrupted; exit
+    # waits for them, but every network call they make has its own timeout.
+    # Where SIGALRM exists (not Windows) it also interrupts blocking calls.
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, _on_run_timeout)
+        signal.alarm(RUN_TIMEOUT)
 
-def main():
-    if not load_environment():
+    cfg = load_environment()
+    if cfg is None:
         sys.exit(1)
 
-    gemini_ok = check_gemini()
-    openai_ok = check_openai()
+    # Step 1 doesn't depend on the AI checks, so start it now and let it
+    # overlap with them; the result is only collected once both pass.
+    background_executor = ThreadPoolExecutor(max_workers=1)
+    news_future = background_executor.submit(fetch_news_from_newsapi, cfg)
+    background_executor.shutdown(wait=False)
+
+    checks = [
+        ("Gemini", lambda: check_gemini(cfg, force=args.check)),
+        ("OpenAI", lambda: check_openai(cfg, force=args.check)),
+    ]
+    results = run_checks_concurrently(checks)
+    for name, _ in checks:
+        for level, message in results[name][1]:
+            logger.log(level, message)
+
+    gemini_ok = results["Gemini"][0]
+    openai_ok = results["OpenAI"][0]
 
     if gemini_ok and openai_ok:
-        print("\nBoth AI APIs are working.")
-        time.sleep(1)
+        logger.info("\nBoth AI APIs are working.")
         
-        articles = fetch_news_from_newsapi()
+        articles = await asyncio.wrap_future(news_future)
         
         if articles:
-            print("\n--- Headlines & AI Summaries ---")
+            # There is now an email to send, so log in to the mail server in
+            # the background while Step 2 runs.
+            smtp_session = SMTPSession(cfg)
+            atexit.register(smtp_session.close)
+            smtp_executor = ThreadPoolExecutor(max_workers=1)
+            smtp_future = smtp_executor.submit(smtp_session.warm)
+            smtp_executor.shutdown(wait=False)
+            
+            logger.info("\n--- Headlines & AI Summaries ---")
             
             now = datetime.now()
             today_date = get_ordinal_date(now)
@@ -394,107 +1398,123 @@ def main():
             email_body_parts.append(f"<h1 style='font-family: Arial, sans-serif;'>News Summary for {today_date}</h1>")
             email_body_parts.append(f"<p style='font-family: Arial, sans-serif;'>Your top {len(articles)} stories.</p><hr>")
             
-            for i, article in enumerate(articles, 1):
-                title = article.get('title', 'No Title Found')
-                url = article.get('url', '#') 
-                author = article.get('author', 'N/A')
-                image_url = article.get('urlToImage', None) 
+            base_summaries = []
+            for article in articles:
+                title = article.title
                 
                 # --- NEW FAILSAFE LOGIC FOR BASE SUMMARY ---
-                base_summary = article.get('description') # Get description
+                base_summary = article.description # Get description
                 
                 # Check if it's None, empty, or just whitespace
                 if not base_summary or not base_summary.strip():
-                    print(f"Warning: No base summary found for '{title}'. Using headline as failsafe.")
+                    logger.warning(f"Warning: No base summary found for '{title}'. Using headline as failsafe.")
                     base_summary = title # Use the headline as the failsafe
                 # --- END OF FAILSAFE LOGIC ---
+                base_summaries.append(base_summary)
+            
+            # Step 2 - Fire every Gemini and OpenAI summary at once (gather keeps
+            # article order); they generate while the images below download.
+            summary_items = [(base_summary, article.title)
+                             for article, base_summary in zip(articles, base_summaries)]
+            summaries_task = asyncio.gather(
+                get_gemini_perspectives(cfg, summary_items),
+                get_openai_perspectives(cfg, summary_items),
+            )
+            
+            # Start every image download now too, so they overlap with the summaries.
+            # Articles sharing an image URL share one download and one attachment.
+            image_executor = ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS)
+            image_futures = {}
+            url_futures = {}
+            image_cids = {}
+            for i, article in enumerate(articles, 1):
+                image_url = article.image_url
+                if image_url and image_url.lower() not in ['n/a', 'none', '']:
+                    if image_url not in url_futures:
+                        url_futures[image_url] = image_executor.submit(
+                            download_image_with_retries, image_url, article.title
+                        )
+                        image_cids[image_url] = f'image{i}'
+                    image_futures[i] = url_futures[image_url]
+            image_executor.shutdown(wait=False)
+            
+            gemini_summaries, openai_summaries = await summaries_task
+            
+            for i, article in enumerate(articles, 1):
+                title = article.title
+                url = article.url
+                author = article.author
+                image_url = article.image_url
+                base_summary = base_summaries[i - 1]
                 
-                
-                # Step 2 - Get AI summaries
-                gemini_summary = get_gemini_perspective(base_summary, title)
-                openai_summary = get_openai_perspective(base_summary, title)
+                gemini_summary = gemini_summaries[i - 1]
+                openai_summary = openai_summaries[i - 1]
 
                 # Console printing
-                print(f"\n## {title}")
-                print(f"Link: {url}")
-                print(f"Author: {author}")
-                print(f"Image: {image_url if image_url else 'N/A'}")
-                print(f"\nBase Summary:\n{base_summary}")
-                print(f"\nGemini Summary:\n{gemini_summary}")
-                print(f"\nOpenAI Summary:\n{openai_summary}")
-                print("-------------------------------------")
+                logger.info(f"\n## {title}")
+                logger.info(f"Link: {url}")
+                logger.info(f"Author: {author}")
+                logger.info(f"Image: {image_url if image_url else 'N/A'}")
+                logger.info(f"\nBase Summary:\n{base_summary}")
+                logger.info(f"\nGemini Summary:\n{gemini_summary}")
+                logger.info(f"\nOpenAI Summary:\n{openai_summary}")
+                logger.info("-------------------------------------")
                 
                 # Build HTML
-                author_part = f"<i style='color: #555;'>{author}</i>" if author and author.lower() != 'n/a' else ""
+                # NewsAPI and model text can contain &, < or quotes, so escape it all.
+                author_part = f"<i style='color: #555;'>{escape(author)}</i>" if author and author.lower() != 'n/a' else ""
                 
                 # --- NEW IMAGE LOGIC WITH RETRIES ---
                 image_part = ""
-                if image_url and image_url.lower() not in ['n/a', 'none', '']:
-                    image_cid = f'image{i}'
-                    image_data, image_subtype = download_image_with_retries(image_url, title)
+                if i in image_futures:
+                    image_cid = image_cids[image_url]
+                    image_data, image_subtype = await asyncio.wrap_future(image_futures[i])
                     
                     if image_data and image_subtype:
                         email_attachments[image_cid] = (image_data, image_subtype)
-                        image_part = f'''
-                        <img src="cid:{image_cid}"
-                             alt="{title}"
-                             style="max-width: 100%; height: auto; border-radius: 8px; margin-bottom: 10px;">
-                        '''
+                        image_part = IMAGE_HTML_TEMPLATE.substitute(cid=image_cid, title=escape(title))
                     else:
                         # Log that it failed, but the loop continues
-                        print(f"Warning: Could not attach image for '{title}' after retries.", file=sys.stderr)
+                        logger.warning(f"Warning: Could not attach image for '{title}' after retries.")
                 # --- END OF NEW IMAGE LOGIC ---
                 
                 
                 # Build the HTML block
-                article_html = f"""
-                <div style="font-family: Arial, sans-serif; margin-bottom: 20px;">
-                    <p style="font-size: 1.2em; margin-bottom: 5px;">
-                        <b>{i}. <a href="{url}" style="color: #1a0dab; text-decoration: none;">{title}</a></b>
-                    </p>
-                    <p style="font-size: 0.9em; color: #333; margin-top: 0; margin-bottom: 10px;">
-                        {author_part}
-                    </p>
-                    
-                    {image_part}
-                    
-                    <b style="font-size: 1.0em;">Summary by Gemini:</b>
-                    <ul style="margin-top: 5px;">
-                        <li>{gemini_summary}</li>
-                    </ul>
-                    
-                    <b style="font-size: 1.0em;">Summary by OpenAI:</b>
-                    <ul style="margin-top: 5px;">
-                        <li>{openai_summary}</li>
-                    </ul>
-                </div>
-                <hr style="border: 0; border-top: 1px solid #eee;">
-                """
-                email_body_parts.append(article_html)
-                
-                # Sleep to avoid rate-limiting
-                time.sleep(1)
+                email_body_parts.append(ARTICLE_HTML_TEMPLATE.substitute(
+                    index=i,
+                    url=escape(url),
+                    title=escape(title),
+                    author_part=author_part,
+                    image_part=image_part,
+                    gemini_summary=escape(gemini_summary),
+                    openai_summary=escape(openai_summary),
+                ))
             
             # Step 3: Send the email
-            final_email_body = f"""
-            <html>
-                <head></head>
-                <body>
-                    {''.join(email_body_parts)}
-                </body>
-            </html>
-            """
-            receiver_email = os.environ.get("EMAIL_RECEIVER")
-            send_email(email_subject, final_email_body, receiver_email, email_attachments)
+            final_email_body = "".join([EMAIL_HTML_HEAD, *email_body_parts, EMAIL_HTML_TAIL])
+            await asyncio.wrap_future(smtp_future)
+            send_email(cfg, email_subject, final_email_body, cfg.email_receiver, email_attachments, smtp_session)
             
         else:
-            print("Could not fetch any articles from NewsAPI. Exiting.", file=sys.stderr)
+            logger.error("Could not fetch any articles from NewsAPI. Exiting.")
 
     else:
-        print("\nOne or more API checks failed. Please check your keys and network.", file=sys.stderr)
+        logger.error("\nOne or more API checks failed. Please check your keys and network.")
         sys.exit(1)
     
-    print("\nScript finished.")
+    logger.info("\nScript finished.")
+
+def run():
+    """
+    Runs main(), stopping it if the whole run exceeds RUN_TIMEOUT.
+    Background downloads still running at that point finish their current
+    (time-limited) request before the process exits.
+    """
+    try:
+        asyncio.run(asyncio.wait_for(main(), RUN_TIMEOUT))
+    except asyncio.TimeoutError:
+        logger.error(f"\nError: Script exceeded {RUN_TIMEOUT}s and was stopped.")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run()
\ No newline at end of file